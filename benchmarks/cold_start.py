@@ -0,0 +1,75 @@
+"""Measure cold-start time: module import, and optionally time until `/` answers.
+
+    python benchmarks/cold_start.py --repeat 5                 # import time per role
+    python benchmarks/cold_start.py --repeat 3 --serve         # + uvicorn boot to first 200
+
+Each sample runs in a fresh interpreter. Check out the previous revision and
+run the same command to compare before/after.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+
+
+def time_import(role):
+    env = {**os.environ, "PROCESS_ROLE": role}
+    out = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET], cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def time_serve(role, port):
+    env = {**os.environ, "PROCESS_ROLE": role}
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port)],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < 60:
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/", timeout=0.5).status_code == 200:
+                    return time.perf_counter() - started
+            except httpx.HTTPError:
+                pass
+            if proc.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with {proc.returncode}")
+            time.sleep(0.02)
+        raise TimeoutError("server did not come up within 60s")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def summary(name, samples):
+    print(f"{name:<16} median={statistics.median(samples) * 1000:8.1f}ms "
+          f"min={min(samples) * 1000:8.1f}ms max={max(samples) * 1000:8.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--roles", default="api,bot,all")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--serve", action="store_true", help="also time uvicorn boot to first 200")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    for role in args.roles.split(","):
+        summary(f"import[{role}]", [time_import(role) for _ in range(args.repeat)])
+        if args.serve:
+            summary(f"serve[{role}]", [time_serve(role, args.port) for _ in range(args.repeat)])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Hammer one user's balance from many tasks and check nothing is lost.
+
+    DATABASE_URL=postgresql://... python benchmarks/credits_stress.py --credits 500 --tasks 2000
+
+Grants ``--credits`` to a fresh user, then fires ``--tasks`` concurrent
+charges (more than the balance) interleaved with top-ups. Afterwards the
+number of successful charges, the final balance and the ledger sum must all
+agree; the script exits non-zero if they don't.
+"""
+import argparse
+import asyncio
+import sys
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import billing  # noqa: E402
+import database  # noqa: E402
+from billing import InsufficientCreditsError  # noqa: E402
+from sqlalchemy import func, select  # noqa: E402
+
+
+async def run(args):
+    database.init_db()
+    user_id = f"stress-{uuid.uuid4().hex[:12]}"
+    await billing.add_credits(user_id, args.credits, reference=f"{user_id}-grant")
+
+    async def charge():
+        try:
+            await billing.charge(user_id)
+            return 1
+        except InsufficientCreditsError:
+            return 0
+
+    async def top_up(i):
+        # Same reference twice: only one of each pair may apply
+        await billing.add_credits(user_id, 1, reference=f"{user_id}-topup-{i}")
+        await billing.add_credits(user_id, 1, reference=f"{user_id}-topup-{i}")
+        return 0
+
+    jobs = [charge() for _ in range(args.tasks)] + [top_up(i) for i in range(args.topups)]
+    started = time.perf_counter()
+    charged = sum(await asyncio.gather(*jobs))
+    elapsed = time.perf_counter() - started
+
+    billing.invalidate(user_id)
+    balance = await billing.get_balance(user_id)
+    with database.SessionLocal() as session:
+        ledger = session.execute(
+            select(func.sum(database.CreditTransaction.delta))
+            .where(database.CreditTransaction.telegram_user_id == user_id)
+        ).scalar()
+
+    expected = args.credits + args.topups - charged
+    print(f"user={user_id} charged={charged} balance={balance} ledger={ledger} expected={expected} "
+          f"elapsed={elapsed:.2f}s ({len(jobs) / elapsed:.0f} ops/s)")
+
+    ok = balance == ledger == expected and balance >= 0 and charged <= args.credits + args.topups
+    print("✅ no lost updates" if ok else "❌ balance mismatch")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--credits", type=int, default=500)
+    parser.add_argument("--tasks", type=int, default=2000)
+    parser.add_argument("--topups", type=int, default=100)
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(run(args)) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Compare local index decoding against the remote NHTSA vPIC path.
+
+    python benchmarks/decode_bench.py --records 50000 --lookups 200000 --remote 20
+
+Builds a synthetic index in a temp dir (or uses --index), then reports
+latency percentiles and throughput for both paths. Pass --remote 0 to skip
+the network calls.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from vin_decoder import VINDecoder, build_index, check_digit  # noqa: E402
+from nhtsa import NHTSAClient  # noqa: E402
+
+ALPHABET = "ABCDEFGHJKLMNPRSTUVWXYZ0123456789"
+
+
+def random_vin(rng):
+    body = "1" + "".join(rng.choice(ALPHABET) for _ in range(16))
+    return body[:8] + check_digit(body[:8] + "0" + body[9:]) + body[9:]
+
+
+def synthetic_rows(rng, count):
+    for _ in range(count):
+        yield {
+            "VIN": random_vin(rng),
+            "Make": rng.choice(["HONDA", "TOYOTA", "FORD", "BMW"]),
+            "Model": rng.choice(["Accord", "Camry", "F-150", "X5"]),
+            "VehicleType": "PASSENGER CAR",
+            "PlantCountry": "UNITED STATES (USA)",
+            "BodyClass": "Sedan/Saloon",
+        }
+
+
+def report(name, samples, elapsed, count):
+    samples = sorted(samples)
+    p = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))] * 1e6  # noqa: E731
+    print(
+        f"{name:<8} n={count:<8} p50={p(0.50):9.1f}µs p99={p(0.99):10.1f}µs "
+        f"mean={statistics.fmean(samples) * 1e6:9.1f}µs throughput={count / elapsed:12.0f}/s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--index", help="existing index file (default: build a synthetic one)")
+    parser.add_argument("--records", type=int, default=50_000)
+    parser.add_argument("--lookups", type=int, default=200_000)
+    parser.add_argument("--remote", type=int, default=20, help="number of NHTSA calls to time")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.index:
+            index_path = args.index
+            vins = [random_vin(rng) for _ in range(1000)]
+        else:
+            rows = list(synthetic_rows(rng, args.records))
+            vins = [row["VIN"] for row in rows]
+            index_path = Path(tmp) / "vin_index.bin"
+            build_index(rows, index_path)
+
+        decoder = VINDecoder.open(index_path)
+        lookups = [rng.choice(vins) for _ in range(args.lookups)]
+
+        samples = []
+        started = time.perf_counter()
+        for vin in lookups:
+            t = time.perf_counter()
+            decoder.decode(vin)
+            samples.append(time.perf_counter() - t)
+        report("local", samples, time.perf_counter() - started, len(lookups))
+        decoder.close()
+
+    if args.remote:
+        asyncio.run(time_remote(vins[:args.remote]))
+
+
+async def time_remote(vins):
+    client = NHTSAClient()
+    await client.start()
+    samples = []
+    started = time.perf_counter()
+    try:
+        for vin in vins:
+            t = time.perf_counter()
+            await client.fetch_report(vin)
+            samples.append(time.perf_counter() - t)
+    finally:
+        await client.aclose()
+    report("remote", samples, time.perf_counter() - started, len(samples))
+
+
+if __name__ == "__main__":
+    main()
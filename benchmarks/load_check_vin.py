@@ -0,0 +1,89 @@
+"""Load test for ``/check-vin`` against a local NHTSA stub.
+
+    STUB_LATENCY_MS=150 uvicorn benchmarks.nhtsa_stub:app --port 9001 &
+    CHARGE_VIN_CHECKS=false API_KEY=bench NHTSA_BASE_URL=http://127.0.0.1:9001/api/vehicles \
+        uvicorn main:app --port 8000 &
+    API_KEY=bench python benchmarks/load_check_vin.py --requests 2000 --concurrency 200
+
+The ``loadtest`` user has no credits, so the app must run with
+CHARGE_VIN_CHECKS=false (``run_load.py`` tops credits up instead). Every request uses a fresh VIN by default (``--repeat`` reuses a small pool),
+so the run measures the upstream path rather than the cache. Run it against
+the previous revision with the same flags to compare p99 and requests/sec.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from vin_decoder import check_digit  # noqa: E402
+
+ALPHABET = "ABCDEFGHJKLMNPRSTUVWXYZ0123456789"
+
+
+def random_vin(rng):
+    body = "1" + "".join(rng.choice(ALPHABET) for _ in range(16))
+    return body[:8] + check_digit(body[:8] + "0" + body[9:]) + body[9:]
+
+
+def percentile(samples, q):
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    pool = [random_vin(rng) for _ in range(args.repeat or args.requests)]
+    queue = asyncio.Queue()
+    for i in range(args.requests):
+        queue.put_nowait(pool[i % len(pool)])
+
+    latencies, errors = [], 0
+
+    async def worker(client):
+        nonlocal errors
+        while not queue.empty():
+            vin = queue.get_nowait()
+            t = time.perf_counter()
+            try:
+                res = await client.post("/check-vin", json={"vin": vin, "user_id": "loadtest"})
+                if res.status_code != 200:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - t)
+
+    limits = httpx.Limits(max_connections=args.concurrency)
+    headers = {"X-API-Key": os.getenv("API_KEY", "")}
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, headers=headers, timeout=60) as client:
+        res = await client.post("/check-vin", json={"vin": pool[0], "user_id": "loadtest"})
+        if res.status_code in (401, 402):
+            sys.exit(f"/check-vin answered {res.status_code}: run the app with CHARGE_VIN_CHECKS=false "
+                     "and the same API_KEY as this script")
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"requests={len(latencies)} errors={errors} elapsed={elapsed:.2f}s rps={len(latencies) / elapsed:.1f}")
+    print(" ".join(f"p{int(q * 100)}={percentile(latencies, q) * 1000:.1f}ms" for q in (0.5, 0.95, 0.99)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=0, help="size of a reused VIN pool (0 = all unique)")
+    parser.add_argument("--seed", type=int, default=7)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
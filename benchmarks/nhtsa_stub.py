@@ -0,0 +1,60 @@
+"""Local stand-in for the NHTSA vPIC API.
+
+    STUB_LATENCY_MS=150 uvicorn benchmarks.nhtsa_stub:app --port 9001
+    NHTSA_BASE_URL=http://127.0.0.1:9001/api/vehicles uvicorn main:app
+
+Answers ``decodevin`` and ``DecodeVINValuesBatch`` with a fixed vehicle after a configurable delay so the
+API can be load-tested without touching the real service.
+"""
+import asyncio
+import os
+from urllib.parse import parse_qs
+
+from fastapi import FastAPI, Request
+
+STUB_LATENCY = float(os.getenv("STUB_LATENCY_MS", "150")) / 1000
+
+app = FastAPI()
+
+VEHICLE = {
+    "Make": "HONDA",
+    "Model": "Accord",
+    "Model Year": "2003",
+    "Vehicle Type": "PASSENGER CAR",
+    "Plant Country": "UNITED STATES (USA)",
+    "Body Class": "Coupe",
+}
+
+
+@app.get("/api/vehicles/decodevin/{vin}")
+async def decodevin(vin: str, format: str = "json"):
+    await asyncio.sleep(STUB_LATENCY)
+    return {
+        "Count": len(VEHICLE),
+        "Message": "Results returned successfully",
+        "SearchCriteria": f"VIN:{vin}",
+        "Results": [{"Variable": k, "Value": v} for k, v in VEHICLE.items()],
+    }
+
+
+@app.post("/api/vehicles/DecodeVINValuesBatch/")
+async def decode_vin_values_batch(request: Request):
+    form = parse_qs((await request.body()).decode())
+    vins = [vin for vin in form.get("data", [""])[0].split(";") if vin]
+    await asyncio.sleep(STUB_LATENCY)
+    return {
+        "Count": len(vins),
+        "Message": "Results returned successfully",
+        "Results": [
+            {
+                "VIN": vin,
+                "Make": VEHICLE["Make"],
+                "Model": VEHICLE["Model"],
+                "ModelYear": VEHICLE["Model Year"],
+                "VehicleType": VEHICLE["Vehicle Type"],
+                "PlantCountry": VEHICLE["Plant Country"],
+                "BodyClass": VEHICLE["Body Class"],
+            }
+            for vin in vins
+        ],
+    }
@@ -0,0 +1,86 @@
+"""Local stand-in for the parts of the Stripe API we use.
+
+    uvicorn benchmarks.stripe_stub:app --port 9002
+    STRIPE_API_BASE=http://127.0.0.1:9002 STRIPE_WEBHOOK_SECRET=whsec_test uvicorn main:app
+
+    python benchmarks/stripe_stub.py send http://127.0.0.1:8000/stripe-webhook whsec_test 12345 3
+
+Creates payment links on ``POST /v1/payment_links``. ``send`` posts a
+signed ``checkout.session.completed`` event for a user and bundle size to
+a webhook URL, the same way Stripe would.
+"""
+import hashlib
+import hmac
+import json
+import re
+import sys
+import time
+import uuid
+from urllib.parse import parse_qsl
+
+from fastapi import FastAPI, Request
+
+app = FastAPI()
+
+counters = {"created": 0}
+
+
+@app.post("/v1/payment_links")
+async def create_payment_link(request: Request):
+    form = dict(parse_qsl((await request.body()).decode()))
+    metadata = {m.group(1): v for k, v in form.items() if (m := re.fullmatch(r"metadata\[(\w+)\]", k))}
+    link_id = f"plink_{uuid.uuid4().hex[:24]}"
+    link = {
+        "id": link_id,
+        "object": "payment_link",
+        "active": True,
+        "url": f"https://buy.stripe.com/test_{link_id}",
+        "metadata": metadata,
+    }
+    counters["created"] += 1
+    return link
+
+
+@app.get("/stats")
+async def stats():
+    return counters
+
+
+def checkout_completed_event(user_id, quantity, session_id=None):
+    return {
+        "id": f"evt_{uuid.uuid4().hex[:24]}",
+        "object": "event",
+        "type": "checkout.session.completed",
+        "data": {
+            "object": {
+                "id": session_id or f"cs_test_{uuid.uuid4().hex[:24]}",
+                "object": "checkout.session",
+                "client_reference_id": str(user_id),
+                "payment_status": "paid",
+                "metadata": {"quantity": str(quantity)},
+            }
+        },
+    }
+
+
+def sign(payload: str, secret: str, timestamp=None) -> str:
+    timestamp = timestamp or int(time.time())
+    signature = hmac.new(secret.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+def send(url, secret, user_id, quantity):
+    import httpx
+
+    payload = json.dumps(checkout_completed_event(user_id, quantity))
+    res = httpx.post(url, content=payload, headers={
+        "Content-Type": "application/json",
+        "Stripe-Signature": sign(payload, secret),
+    })
+    print(res.status_code, res.text)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 6 or sys.argv[1] != "send":
+        sys.exit("usage: python benchmarks/stripe_stub.py send <webhook_url> <secret> <user_id> <quantity>")
+    send(*sys.argv[2:])
@@ -0,0 +1,89 @@
+"""Local stand-in for the Telegram Bot API.
+
+    uvicorn benchmarks.telegram_stub:app --port 9003
+    TELEGRAM_API_BASE=http://127.0.0.1:9003 BOT_MODE=webhook uvicorn main:app
+
+Accepts every Bot API method the bot calls and answers with a minimal valid
+result. Messages the bot sends are counted per chat; ``expect_replies``
+lets an in-process load generator await them (see ``run_load.py``).
+"""
+import asyncio
+import itertools
+import json
+import time
+from collections import defaultdict
+from urllib.parse import parse_qsl
+
+from fastapi import FastAPI, Request
+
+app = FastAPI()
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "CarFact", "username": "carfact_stub_bot"}
+
+counters = defaultdict(int)
+_message_ids = itertools.count(1)
+_sent = defaultdict(int)
+_waiters = defaultdict(list)
+
+
+async def _params(request: Request):
+    # Parsed by hand like nhtsa_stub: request.form() would need python-multipart
+    body = await request.body()
+    if request.headers.get("content-type", "").startswith("application/json"):
+        return json.loads(body or b"{}")
+    return dict(parse_qsl(body.decode()))
+
+
+def _record_reply(chat_id):
+    _sent[chat_id] += 1
+    pending = []
+    for count, future in _waiters[chat_id]:
+        if future.done():
+            continue  # timed out on the caller's side
+        if _sent[chat_id] >= count:
+            future.set_result(time.perf_counter())
+        else:
+            pending.append((count, future))
+    _waiters[chat_id] = pending
+
+
+def expect_replies(chat_id, count):
+    """Future resolved (with the arrival time) once ``count`` more messages have been sent to ``chat_id``.
+
+    Call it before sending the update, so a fast reply can't be missed.
+    """
+    future = asyncio.get_running_loop().create_future()
+    _waiters[chat_id].append((_sent[chat_id] + count, future))
+    return future
+
+
+def _message(chat_id, text):
+    return {
+        "message_id": next(_message_ids),
+        "date": int(time.time()),
+        "chat": {"id": chat_id, "type": "private"},
+        "from": BOT_USER,
+        "text": text,
+    }
+
+
+@app.post("/bot{token}/{method}")
+async def bot_method(token: str, method: str, request: Request):
+    params = await _params(request)
+    counters[method] += 1
+
+    if method == "getMe":
+        result = BOT_USER
+    elif method in ("sendMessage", "editMessageText"):
+        chat_id = int(params["chat_id"])
+        result = _message(chat_id, params.get("text", ""))
+        _record_reply(chat_id)
+    else:
+        # setWebhook, deleteWebhook, answerCallbackQuery, ...
+        result = True
+    return {"ok": True, "result": result}
+
+
+@app.get("/stats")
+async def stats():
+    return counters
@@ -0,0 +1,76 @@
+"""Credit balances on top of the ledger in ``database``.
+
+Every write is a single atomic statement, so concurrent charges for one user
+can't double-spend. Balances are read through a small per-process cache
+that each write refreshes with the balance the database returned; the TTL
+bounds staleness from writes made by other processes.
+"""
+import asyncio
+import logging
+import os
+import time
+
+import database
+from metrics import DB_SECONDS
+
+logger = logging.getLogger(__name__)
+
+BALANCE_CACHE_TTL = float(os.getenv("BALANCE_CACHE_TTL", "30"))
+
+
+class InsufficientCreditsError(Exception):
+    pass
+
+
+_balances = {}
+
+
+def _remember(user_id, balance):
+    _balances[user_id] = (balance, time.monotonic() + BALANCE_CACHE_TTL)
+
+
+def invalidate(user_id):
+    _balances.pop(user_id, None)
+
+
+async def get_balance(user_id: str) -> int:
+    cached = _balances.get(user_id)
+    if cached is not None and cached[1] > time.monotonic():
+        return cached[0]
+
+    with DB_SECONDS.time(op="get_credits"):
+        balance = await asyncio.to_thread(database.get_vin_credits, user_id)
+    _remember(user_id, balance)
+    return balance
+
+
+async def charge(user_id: str, amount: int = 1, reason: str = "vin_check") -> int:
+    """Take ``amount`` credits or raise InsufficientCreditsError; returns the new balance."""
+    with DB_SECONDS.time(op="use_credit"):
+        balance = await asyncio.to_thread(database.use_vin_credit, user_id, amount, reason)
+    if balance is None:
+        invalidate(user_id)
+        raise InsufficientCreditsError(user_id)
+    _remember(user_id, balance)
+    return balance
+
+
+async def add_credits(user_id: str, quantity: int, reason: str = "purchase", reference: str = None):
+    """Add credits; returns the new balance, or None if ``reference`` was already applied."""
+    with DB_SECONDS.time(op="add_credits"):
+        balance = await asyncio.to_thread(database.add_vin_credits_to_user, user_id, quantity, reason, reference)
+    if balance is None:
+        invalidate(user_id)
+    else:
+        _remember(user_id, balance)
+    return balance
+
+
+async def refund(user_id: str, amount: int = 1):
+    # Called from error paths; a failed refund is logged rather than masking the original error
+    if amount <= 0:
+        return
+    try:
+        await add_credits(user_id, amount, reason="refund")
+    except Exception:
+        logger.exception("Credit refund failed", extra={"user_id": user_id, "amount": amount})
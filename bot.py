@@ -0,0 +1,392 @@
+"""CarFact Telegram bot.
+
+One long-lived ``Application`` serves either mode, selected by ``BOT_MODE``:
+
+* ``polling`` — the Application's own updater long-polls ``getUpdates``.
+* ``webhook`` — Telegram posts updates to ``/{TELEGRAM_TOKEN}``; the route
+  only enqueues them on a bounded queue and returns, and ``BOT_WORKERS``
+  workers feed them to the Application.
+"""
+import asyncio
+import logging
+import os
+import re
+from pathlib import Path
+
+from dotenv import load_dotenv
+from telegram import Update, ReplyKeyboardMarkup, InlineKeyboardMarkup, InlineKeyboardButton
+from telegram.ext import (
+    ApplicationBuilder, CommandHandler, MessageHandler, CallbackQueryHandler, ContextTypes, filters,
+)
+
+import billing
+import payment
+import vin_service
+from metrics import BOT_REPLY_SECONDS, REPORT_FORMAT_SECONDS
+from vin_service import InvalidVINError, VINLookupError, InsufficientCreditsError
+
+load_dotenv(Path(__file__).resolve().parent / '.env')
+
+TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_TOKEN")
+TELEGRAM_WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET")
+# Bot API server; point at benchmarks/telegram_stub.py for offline load tests
+TELEGRAM_API_BASE = os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org")
+DOMAIN = os.getenv("DOMAIN")
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "64"))
+BOT_UPDATE_QUEUE_SIZE = int(os.getenv("BOT_UPDATE_QUEUE_SIZE", "1000"))
+BOT_SHUTDOWN_TIMEOUT = float(os.getenv("BOT_SHUTDOWN_TIMEOUT", "10"))
+HISTORY_PAGE_SIZE = 10
+BATCH_MAX_FILE_BYTES = int(os.getenv("BATCH_MAX_FILE_BYTES", str(256 * 1024)))
+
+VIN_PATTERN = re.compile(r"\b[A-Za-z0-9]{17}\b")
+# Telegram rejects messages longer than 4096 characters
+MESSAGE_LIMIT = 4000
+
+START_TEXT = (
+    "📟 <b>CarFact</b> — ստուգիր քո ավտոմեքենայի պատմությունը VIN-ի միջոցով\n"
+    "🚗 Իմացիր՝\n"
+    "• քանի <b>սեփականատեր</b> է ունեցել մեքենան\n"
+    "• եղել են արդյոք <b>վթարներ</b>\n"
+    "• քանի <b>կիլոմետր</b> է անցել\n"
+    "• երբ է <b>ներմուծվել</b>\n\n"
+    "Սեղմիր '🔍 Ստուգել VIN'՝ ստուգումը սկսելու համար։"
+)
+
+NO_CREDITS_TEXT = "💳 Ձեր հաշվին VIN ստուգումներ չեն մնացել։ Խնդրում ենք համալրել հաշիվը։"
+
+logger = logging.getLogger(__name__)
+
+keyboard = ReplyKeyboardMarkup([["🔍 Ստուգել VIN"]], resize_keyboard=True)
+
+# ========== HANDLERS ========== #
+
+@BOT_REPLY_SECONDS.timed(handler="start")
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await update.message.reply_html(START_TEXT, reply_markup=keyboard)
+
+@BOT_REPLY_SECONDS.timed(handler="vin_prompt")
+async def handle_vin_prompt(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await update.message.reply_text("📥 Խնդրում ենք ուղարկել ավտոմեքենայի VIN կոդը (17 նիշ):")
+
+@BOT_REPLY_SECONDS.timed(handler="vin_input")
+async def handle_vin_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    vins = extract_vins(update.message.text)
+    if len(vins) > 1:
+        await handle_vin_batch(update, vins)
+        return
+
+    try:
+        vin = vin_service.normalize_vin(update.message.text)
+    except InvalidVINError:
+        await update.message.reply_text("⚠️ Սխալ VIN։ Այն պետք է լինի 17 նիշ և բաղկացած լինի միայն տառերից և թվերից։")
+        return
+
+    await update.message.reply_text(f"🔎 Ստուգում եմ VIN: {vin} ...")
+
+    try:
+        report = await vin_service.check_vin(vin, str(update.effective_user.id))
+        await update.message.reply_html(format_report_message(vin, report))
+    except InsufficientCreditsError:
+        await reply_no_credits(update.message, str(update.effective_user.id))
+    except VINLookupError as e:
+        await update.message.reply_text("⚠️ Չհաջողվեց ստանալ տվյալներ։")
+        logger.warning("VIN lookup failed", extra={"vin": vin, "cause": repr(e.__cause__)})
+    except Exception:
+        await update.message.reply_text("⚠️ Սերվերի սխալ կամ կապի խնդիր։")
+        logger.exception("VIN check failed", extra={"vin": vin})
+
+@BOT_REPLY_SECONDS.timed(handler="vin_file")
+async def handle_vin_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    document = update.message.document
+    if document.file_size and document.file_size > BATCH_MAX_FILE_BYTES:
+        await update.message.reply_text("⚠️ Ֆայլը չափազանց մեծ է։")
+        return
+
+    try:
+        file = await document.get_file()
+        content = bytes(await file.download_as_bytearray()).decode("utf-8", errors="ignore")
+    except Exception:
+        await update.message.reply_text("⚠️ Սերվերի սխալ կամ կապի խնդիր։")
+        logger.exception("Downloading VIN file failed")
+        return
+
+    vins = extract_vins(content)
+    if not vins:
+        await update.message.reply_text("⚠️ Ֆայլում VIN կոդեր չեն գտնվել։")
+        return
+
+    await handle_vin_batch(update, vins)
+
+async def handle_vin_batch(update: Update, vins):
+    if len(vins) > vin_service.BATCH_MAX_VINS:
+        await update.message.reply_text(
+            f"⚠️ Մեկ անգամից կարելի է ստուգել առավելագույնը {vin_service.BATCH_MAX_VINS} VIN։"
+        )
+        return
+
+    await update.message.reply_text(f"🔎 Ստուգում եմ {len(vins)} VIN ...")
+
+    try:
+        batch = await vin_service.check_vins(vins, str(update.effective_user.id))
+        try:
+            results = [result async for result in batch]
+        finally:
+            await batch.aclose()
+        for message in format_batch_messages(results):
+            await update.message.reply_html(message)
+    except InsufficientCreditsError:
+        await reply_no_credits(update.message, str(update.effective_user.id))
+    except Exception:
+        await update.message.reply_text("⚠️ Սերվերի սխալ կամ կապի խնդիր։")
+        logger.exception("VIN batch failed", extra={"vins": len(vins)})
+
+@BOT_REPLY_SECONDS.timed(handler="history")
+async def handle_history(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await send_history_page(update.message, str(update.effective_user.id))
+
+@BOT_REPLY_SECONDS.timed(handler="history_more")
+async def handle_history_more(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+    cursor = query.data.removeprefix("history:")
+    await send_history_page(query.message, str(query.from_user.id), cursor)
+
+@BOT_REPLY_SECONDS.timed(handler="balance")
+async def handle_balance(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = str(update.effective_user.id)
+    try:
+        balance = await billing.get_balance(user_id)
+    except Exception:
+        await update.message.reply_text("⚠️ Սերվերի սխալ կամ կապի խնդիր։")
+        logger.exception("Balance lookup failed", extra={"user_id": user_id})
+        return
+
+    if balance <= 0:
+        await reply_no_credits(update.message, user_id)
+        return
+    await update.message.reply_text(f"💳 Ձեր հաշվին մնացել է {balance} VIN ստուգում։")
+
+async def send_history_page(message, user_id, cursor=None):
+    try:
+        history, next_cursor = await vin_service.get_history(user_id, HISTORY_PAGE_SIZE, cursor)
+        markup = None
+        if next_cursor:
+            markup = InlineKeyboardMarkup(
+                [[InlineKeyboardButton("➡️ Ավելին", callback_data=f"history:{next_cursor}")]]
+            )
+        await message.reply_html(format_history_message(history, first_page=cursor is None), reply_markup=markup)
+    except Exception:
+        await message.reply_text("⚠️ Սերվերի սխալ կամ կապի խնդիր։")
+        logger.exception("History page failed", extra={"user_id": user_id})
+
+async def reply_no_credits(message, user_id):
+    markup = None
+    try:
+        links = [
+            (quantity, await asyncio.to_thread(payment.create_vin_payment, quantity, user_id))
+            for quantity in (1, 3)
+        ]
+        markup = InlineKeyboardMarkup([[InlineKeyboardButton(f"💳 {q} VIN", url=url)] for q, url in links])
+    except Exception:
+        logger.exception("Creating payment links failed", extra={"user_id": user_id})
+    await message.reply_text(NO_CREDITS_TEXT, reply_markup=markup)
+
+# ========== APPLICATION ========== #
+
+def build_application(mode=BOT_MODE, workers=BOT_WORKERS):
+    builder = (
+        ApplicationBuilder()
+        .token(TELEGRAM_BOT_TOKEN)
+        .base_url(f"{TELEGRAM_API_BASE}/bot")
+        .base_file_url(f"{TELEGRAM_API_BASE}/file/bot")
+    )
+    if mode == "webhook":
+        # Updates arrive over HTTP; our own workers provide the concurrency
+        builder = builder.updater(None)
+    else:
+        # Lookups await the service, so let updates from different users overlap
+        builder = builder.concurrent_updates(workers)
+    application = builder.build()
+
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("history", handle_history))
+    application.add_handler(CommandHandler("balance", handle_balance))
+    application.add_handler(CallbackQueryHandler(handle_history_more, pattern="^history:"))
+    application.add_handler(MessageHandler(filters.Regex("^🔍 Ստուգել VIN$"), handle_vin_prompt))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_vin_input))
+    application.add_handler(MessageHandler(
+        filters.Document.FileExtension("csv") | filters.Document.FileExtension("txt"), handle_vin_file
+    ))
+    return application
+
+
+class TelegramBot:
+    def __init__(self, mode=BOT_MODE, workers=BOT_WORKERS, queue_size=BOT_UPDATE_QUEUE_SIZE):
+        if mode not in ("polling", "webhook"):
+            raise ValueError(f"Unknown BOT_MODE: {mode}")
+        self.mode = mode
+        self.workers = workers
+        self.application = None
+        self._stopping = False
+        self._queue = asyncio.Queue(maxsize=queue_size)
+        self._tasks = []
+
+    @property
+    def webhook_path(self):
+        return f"/{TELEGRAM_BOT_TOKEN}"
+
+    async def start(self):
+        application = build_application(self.mode, self.workers)
+        await application.initialize()
+        await application.start()
+        self.application = application
+        self._stopping = False
+
+        if self.mode == "webhook":
+            self._tasks = [asyncio.create_task(self._worker(application)) for _ in range(self.workers)]
+            await application.bot.set_webhook(
+                url=f"{DOMAIN}{self.webhook_path}",
+                secret_token=TELEGRAM_WEBHOOK_SECRET,
+                allowed_updates=Update.ALL_TYPES,
+            )
+        else:
+            # A webhook left over from webhook mode would make getUpdates fail
+            await application.bot.delete_webhook()
+            await application.updater.start_polling()
+
+        logger.info("Telegram bot is running", extra={"mode": self.mode, "workers": self.workers})
+
+    def enqueue(self, data) -> bool:
+        """Queue a webhook payload; False means the queue is full (or the bot isn't up)."""
+        if self.application is None or self._stopping:
+            return False
+        try:
+            self._queue.put_nowait(Update.de_json(data, self.application.bot))
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    async def _worker(self, application):
+        while True:
+            update = await self._queue.get()
+            try:
+                await application.process_update(update)
+            except Exception:
+                logger.exception("Processing update failed", extra={"update_id": update.update_id})
+            finally:
+                self._queue.task_done()
+
+    async def stop(self):
+        application = self.application
+        if application is None or self._stopping:
+            return
+        # Refuse new updates, but keep the application up until the queue is drained
+        self._stopping = True
+
+        if self.mode == "webhook":
+            try:
+                await asyncio.wait_for(self._queue.join(), BOT_SHUTDOWN_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.error("Dropping queued updates on shutdown", extra={"queued": self._queue.qsize()})
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            self._tasks = []
+        else:
+            await application.updater.stop()
+
+        await application.stop()
+        await application.shutdown()
+        self.application = None
+
+    def stats(self):
+        return {"mode": self.mode, "workers": self.workers, "queued": self._queue.qsize()}
+
+
+telegram_bot = TelegramBot()
+
+# ========== HELPERS ========== #
+
+def extract_vins(text):
+    return list(dict.fromkeys(match.upper() for match in VIN_PATTERN.findall(text or "")))
+
+@REPORT_FORMAT_SECONDS.timed(kind="report")
+def format_report_message(vin, r):
+    if not r:
+        return f"⚠️ Չհաջողվեց ստանալ VIN {vin}-ի տվյալները։"
+
+    return (
+        f"📄 <b>Վճարված VIN ստուգման արդյունքներ ({vin})</b>\n\n"
+        f"🏷️ Արտադրող: {r.get('make')}\n"
+        f"🚘 Մոդել: {r.get('model')}\n"
+        f"📆 Տարին: {r.get('year')}\n"
+        f"🚗 Տեսակ: {r.get('vehicle_type')}\n"
+        f"🏭 Գործարան: {r.get('plant_country')}\n"
+        f"🚙 Մարմնի տիպը: {r.get('body_class')}"
+    )
+
+@REPORT_FORMAT_SECONDS.timed(kind="history")
+def format_history_message(history, first_page=True):
+    if not history:
+        return "📭 Դուք դեռ VIN ստուգումներ չեք կատարել։" if first_page else "📭 Այլ ստուգումներ չկան։"
+
+    lines = ["🕘 <b>Ձեր վերջին ստուգումները</b>\n"] if first_page else []
+    for item in history:
+        r = item["report"] or {}
+        lines.append(
+            f"• <code>{item['vin']}</code> — {r.get('make')} {r.get('model')} {r.get('year')} "
+            f"({item['timestamp'][:10]})"
+        )
+    return "\n".join(lines)
+
+@REPORT_FORMAT_SECONDS.timed(kind="batch")
+def format_batch_messages(results):
+    counts = {"ok": 0, "invalid": 0, "error": 0}
+    lines = []
+    for result in results:
+        counts[result["status"]] += 1
+        vin = result["vin"]
+        if result["status"] == "ok":
+            r = result["report"]
+            lines.append(f"✅ <code>{vin}</code> — {r.get('make')} {r.get('model')} {r.get('year')}")
+        elif result["status"] == "invalid":
+            lines.append(f"⚠️ <code>{vin}</code> — սխալ VIN")
+        else:
+            lines.append(f"❌ <code>{vin}</code> — տվյալներ չստացվեցին")
+
+    header = (
+        f"📄 <b>VIN ստուգման արդյունքներ ({len(results)})</b>\n"
+        f"✅ {counts['ok']} · ⚠️ {counts['invalid']} · ❌ {counts['error']}\n"
+    )
+
+    messages, current = [], header
+    for line in lines:
+        if len(current) + len(line) + 1 > MESSAGE_LIMIT:
+            messages.append(current)
+            current = ""
+        current += "\n" + line
+    messages.append(current)
+    return messages
+
+# ========== STANDALONE PROCESS ========== #
+
+async def run_polling():
+    """Run the bot on its own (PROCESS_ROLE=bot without an HTTP server)."""
+    await vin_service.startup()
+    await telegram_bot.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await telegram_bot.stop()
+        await vin_service.shutdown()
+
+if __name__ == "__main__":
+    from logging_config import configure_logging
+    configure_logging()
+    if BOT_MODE != "polling":
+        raise SystemExit("Webhook mode needs an HTTP server: run `PROCESS_ROLE=bot uvicorn main:app` instead.")
+    try:
+        asyncio.run(run_polling())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,123 @@
+"""Write-behind pipeline for ``VINLog`` audit rows.
+
+Lookups put rows on a bounded in-memory queue and return; one background
+task drains it and writes each batch with a single multi-row INSERT, once
+``batch_size`` rows are waiting or ``interval`` seconds have passed since the
+batch was started. A full queue makes writers wait (backpressure) until there
+is room. Setting ``put_timeout`` (LOG_PUT_TIMEOUT) bounds that wait instead;
+a row that times out is a lost audit row, logged at ERROR with its VIN and
+user and counted as ``dropped_audit_rows`` in ``/stats``.
+
+Rows are stamped when ``write()`` is called, so a slow queue doesn't skew
+the recorded time.
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+
+from metrics import DB_SECONDS
+
+logger = logging.getLogger(__name__)
+
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "500"))
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", "1"))
+# Seconds; 0 (the default) waits for room rather than dropping audit rows
+LOG_PUT_TIMEOUT = float(os.getenv("LOG_PUT_TIMEOUT", "0")) or None
+
+_STOP = object()
+
+
+class LogWriter:
+    def __init__(self, flush, max_queue=LOG_QUEUE_SIZE, batch_size=LOG_BATCH_SIZE,
+                 interval=LOG_FLUSH_INTERVAL, put_timeout=LOG_PUT_TIMEOUT):
+        """``flush(rows)`` is a blocking callable that persists a list of rows;
+        each row arrives as written with its UTC write time appended."""
+        self._flush_rows = flush
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.interval = interval
+        self.put_timeout = put_timeout
+        self._queue = asyncio.Queue(maxsize=max_queue)
+        self._task = None
+        self._counters = dict.fromkeys(("written", "flushes", "failed", "dropped_audit_rows"), 0)
+        self._flush_ms = {"last": 0.0, "max": 0.0, "total": 0.0}
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush everything queued so far and stop the background task."""
+        if self._task is None:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    async def write(self, row):
+        try:
+            await asyncio.wait_for(self._queue.put((*row, datetime.utcnow())), self.put_timeout)
+        except asyncio.TimeoutError:
+            self._counters["dropped_audit_rows"] += 1
+            logger.error(
+                "VIN log queue full, audit row lost",
+                extra={"vin": row[0], "user_id": row[1], "put_timeout": self.put_timeout},
+            )
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = loop.time() + self.interval
+
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._flush(batch)
+
+    async def _flush(self, batch):
+        started = time.perf_counter()
+        try:
+            await asyncio.to_thread(self._flush_rows, batch)
+            self._counters["written"] += len(batch)
+        except Exception:
+            self._counters["failed"] += len(batch)
+            logger.exception("VIN log flush failed", extra={"rows": len(batch)})
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            DB_SECONDS.observe(elapsed / 1000, op="save_vin_logs")
+            self._counters["flushes"] += 1
+            self._flush_ms["last"] = elapsed
+            self._flush_ms["max"] = max(self._flush_ms["max"], elapsed)
+            self._flush_ms["total"] += elapsed
+
+    def stats(self):
+        flushes = self._counters["flushes"]
+        return {
+            **self._counters,
+            "queued": self._queue.qsize(),
+            "max_queue": self.max_queue,
+            "flush_ms_last": round(self._flush_ms["last"], 2),
+            "flush_ms_max": round(self._flush_ms["max"], 2),
+            "flush_ms_avg": round(self._flush_ms["total"] / flushes, 2) if flushes else 0.0,
+        }
@@ -1,111 +1,152 @@
 import os
+import hmac
 import json
+import time
 import asyncio
+import logging
+from contextlib import asynccontextmanager
 from pathlib import Path
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, Request
-import stripe
-import requests
+from fastapi import FastAPI, APIRouter, Depends, Header, HTTPException, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from datetime import datetime
-from telegram import Update, ReplyKeyboardMarkup
-from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, ContextTypes, filters
+import metrics
+import vin_service
+from logging_config import configure_logging
+from vin_service import InvalidVINError, VINLookupError, InvalidCursorError, InsufficientCreditsError
 
 # Load environment variables
 BASE_DIR = Path(__file__).resolve().parent
 load_dotenv(BASE_DIR / '.env')
+configure_logging()
+logger = logging.getLogger("carfact")
 
-STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY")
 STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_TOKEN")
 DOMAIN = os.getenv("DOMAIN")
-DATABASE_URL = os.getenv("DATABASE_URL")
-
-stripe.api_key = STRIPE_SECRET_KEY
-
-app = FastAPI()
-
-# Database setup
-Base = declarative_base()
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(bind=engine)
-
-class VINLog(Base):
-    __tablename__ = "vin_logs"
-
-    id = Column(Integer, primary_key=True, index=True)
-    vin = Column(String(17), index=True)
-    user_id = Column(String(50), index=True)
-    report = Column(Text)
-    timestamp = Column(DateTime, default=datetime.utcnow)
-
-Base.metadata.create_all(bind=engine)
-
-START_TEXT = (
-    "📟 <b>CarFact</b> — ստուգիր քո ավտոմեքենայի պատմությունը VIN-ի միջոցով\n"
-    "🚗 Իմացիր՝\n"
-    "• քանի <b>սեփականատեր</b> է ունեցել մեքենան\n"
-    "• եղել են արդյոք <b>վթարներ</b>\n"
-    "• քանի <b>կիլոմետր</b> է անցել\n"
-    "• երբ է <b>ներմուծվել</b>\n\n"
-    "Սեղմիր '🔍 Ստուգել VIN'՝ ստուգումը սկսելու համար։"
-)
-
-keyboard = ReplyKeyboardMarkup([["🔍 Ստուգել VIN"]], resize_keyboard=True)
+# Shared secret for the lookup/history routes; they charge and read whatever
+# user_id they are given, so without it they are closed
+API_KEY = os.getenv("API_KEY")
+
+# What this process runs: "api" (HTTP routes, safe to scale with --workers),
+# "bot" (the single Telegram consumer) or "all" (both, single process)
+PROCESS_ROLE = os.getenv("PROCESS_ROLE", "all")
+if PROCESS_ROLE not in ("api", "bot", "all"):
+    raise RuntimeError(f"Unknown PROCESS_ROLE: {PROCESS_ROLE}")
+RUN_API = PROCESS_ROLE in ("api", "all")
+RUN_BOT = PROCESS_ROLE in ("bot", "all")
+
+# Heavy clients are only imported by the role that uses them
+if RUN_API:
+    from payment import stripe_events, parse_webhook_event
+if RUN_BOT:
+    from bot import telegram_bot, TELEGRAM_WEBHOOK_SECRET
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await vin_service.startup()
+    if RUN_API:
+        await stripe_events.start()
+    if RUN_BOT:
+        asyncio.create_task(start_telegram_bot())
+    if RUN_API and not API_KEY:
+        logger.warning("API_KEY is not set; /check-vin, /check-vins and /history will reject every request")
+    logger.info("CarFact is running", extra={"role": PROCESS_ROLE})
+    yield
+    if RUN_BOT:
+        await telegram_bot.stop()
+    if RUN_API:
+        await stripe_events.stop()
+    await vin_service.shutdown()
 
 async def start_telegram_bot():
-    bot_app = ApplicationBuilder().token(TELEGRAM_BOT_TOKEN).build()
-
-    async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-        await update.message.reply_html(START_TEXT, reply_markup=keyboard)
-
-    async def handle_vin_prompt(update: Update, context: ContextTypes.DEFAULT_TYPE):
-        await update.message.reply_text("📥 Խնդրում ենք ուղարկել ավտոմեքենայի VIN կոդը (17 նիշ):")
-
-    async def handle_vin_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
-        vin = update.message.text.strip().upper()
-        if len(vin) == 17 and vin.isalnum():
-            await update.message.reply_text(f"🔎 Ստուգում եմ VIN: {vin} ...")
-
-            try:
-                response = requests.post(
-                    f"{DOMAIN}/check-vin",
-                    json={"vin": vin, "user_id": str(update.effective_user.id)},
-                    timeout=20
+    try:
+        await telegram_bot.start()
+    except Exception:
+        logger.exception("Telegram bot failed to start")
+
+app = FastAPI(lifespan=lifespan)
+api_router = APIRouter()
+bot_router = APIRouter()
+
+class RequestTimingMiddleware:
+    """Plain ASGI middleware timing each request until its last body chunk is
+    sent, so streamed responses such as /check-vins are measured in full."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+        observed = False
+
+        def observe():
+            nonlocal observed
+            if not observed:
+                observed = True
+                metrics.HTTP_REQUEST_SECONDS.observe(
+                    time.perf_counter() - started, method=scope["method"], route=route_label(scope), status=status,
                 )
-                data = response.json()
-
-                if data.get("status") == "ok":
-                    r = data["report"]
-                    message = format_report_message(vin, r)
-                    await update.message.reply_html(message)
-                else:
-                    await update.message.reply_text("⚠️ Չհաջողվեց ստանալ տվյալներ։")
-
-            except Exception as e:
-                await update.message.reply_text("⚠️ Սերվերի սխալ կամ կապի խնդիր։")
-                print(f"[ERROR] {e}")
-        else:
-            await update.message.reply_text("⚠️ Սխալ VIN։ Այն պետք է լինի 17 նիշ և բաղկացած լինի միայն տառերից և թվերից։")
-
-    # Add handlers
-    bot_app.add_handler(CommandHandler("start", start))
-    bot_app.add_handler(CommandHandler("history", handle_history))
-    bot_app.add_handler(MessageHandler(filters.Regex("^🔍 Ստուգել VIN$"), handle_vin_prompt))
-    bot_app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_vin_input))
-
-    print("🤖 Telegram Bot is running...")
-    await bot_app.initialize()
-    await bot_app.start()
-    await bot_app.updater.start_polling()
-
-@app.on_event("startup")
-async def on_startup():
-    asyncio.create_task(start_telegram_bot())
-    print("🚀 CarFact API and Bot are running...")
+
+        async def timed_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                observe()
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            # Errors and client disconnects never send a final body
+            observe()
+
+def route_label(scope) -> str:
+    # The route template keeps /history/{user_id} to one series; the webhook path is the bot token
+    route = scope.get("route")
+    if route is None:
+        return "unmatched"
+    if route.name == "telegram_webhook":
+        return "/telegram-webhook"
+    return route.path
+
+app.add_middleware(RequestTimingMiddleware)
+
+class NDJSONLines:
+    """Body iterator that owns ``results``: closing it closes (and refunds) the
+    batch even if the response never pulled a line."""
+
+    def __init__(self, results):
+        self.results = results
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        result = await self.results.__anext__()
+        return json.dumps(result, ensure_ascii=False) + "\n"
+
+    async def aclose(self):
+        await self.results.aclose()
+
+class ClosingStreamingResponse(StreamingResponse):
+    """Closes its body iterator even when the client disconnects before or during the stream."""
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.body_iterator.aclose()
+
+def require_api_key(x_api_key: str = Header(None)):
+    if not API_KEY or not x_api_key or not hmac.compare_digest(x_api_key, API_KEY):
+        raise HTTPException(status_code=401, detail="Invalid API key")
 
 # ========== MODELS ========== #
 
@@ -113,92 +154,92 @@ class VINRequest(BaseModel):
     vin: str
     user_id: str
 
+class VINBatchRequest(BaseModel):
+    vins: list[str]
+    user_id: str
+
 # ========== ROUTES ========== #
 
 @app.get("/")
 def root():
     return {"message": "Welcome to CarFact!"}
 
-@app.post("/check-vin")
-def check_vin(data: VINRequest):
-    vin = data.vin.upper()
+@app.get("/stats")
+def get_stats():
+    stats = {"role": PROCESS_ROLE, **vin_service.stats()}
+    if RUN_BOT:
+        stats["bot"] = telegram_bot.stats()
+    return stats
 
-    if len(vin) != 17 or not vin.isalnum():
+@app.get("/metrics")
+def get_metrics():
+    return PlainTextResponse(metrics.render(get_stats()), media_type="text/plain; version=0.0.4")
+
+@api_router.post("/check-vin", dependencies=[Depends(require_api_key)])
+async def check_vin(data: VINRequest):
+    try:
+        report = await vin_service.check_vin(data.vin, data.user_id)
+    except InvalidVINError:
         raise HTTPException(status_code=400, detail="Invalid VIN")
+    except InsufficientCreditsError:
+        raise HTTPException(status_code=402, detail="Not enough credits")
+    except VINLookupError as e:
+        logger.warning("VIN lookup failed", extra={"vin": data.vin, "cause": repr(e.__cause__)})
+        raise HTTPException(status_code=500, detail="Failed to fetch VIN data")
+
+    return {"status": "ok", "report": report}
 
-    url = f"https://vpic.nhtsa.dot.gov/api/vehicles/decodevin/{vin}?format=json"
+@api_router.post("/check-vins", dependencies=[Depends(require_api_key)])
+async def check_vins(data: VINBatchRequest):
+    if len(data.vins) > vin_service.BATCH_MAX_VINS:
+        raise HTTPException(status_code=400, detail=f"At most {vin_service.BATCH_MAX_VINS} VINs per batch")
 
     try:
-        res = requests.get(url, timeout=10)
-        res.raise_for_status()
-        decoded = res.json()
-
-        fields = {item["Variable"]: item["Value"] for item in decoded["Results"] if item["Value"]}
-        report = {
-            "vin": vin,
-            "make": fields.get("Make"),
-            "model": fields.get("Model"),
-            "year": fields.get("Model Year"),
-            "vehicle_type": fields.get("Vehicle Type"),
-            "plant_country": fields.get("Plant Country"),
-            "body_class": fields.get("Body Class"),
-        }
-
-        # Save to DB
-        db = SessionLocal()
-        log = VINLog(
-            vin=vin,
-            user_id=data.user_id,
-            report=json.dumps(report)
-        )
-        db.add(log)
-        db.commit()
-        db.close()
+        results = await vin_service.check_vins(data.vins, data.user_id)
+    except InsufficientCreditsError:
+        raise HTTPException(status_code=402, detail="Not enough credits")
 
-        return {"status": "ok", "report": report}
+    # One JSON line per VIN, streamed as results come in
+    return ClosingStreamingResponse(NDJSONLines(results), media_type="application/x-ndjson")
 
-    except Exception as e:
-        print("[API ERROR]", e)
-        raise HTTPException(status_code=500, detail="Failed to fetch VIN data")
+@api_router.get("/history/{user_id}", dependencies=[Depends(require_api_key)])
+async def get_user_history(user_id: str, limit: int = 10, cursor: str = None):
+    try:
+        history, next_cursor = await vin_service.get_history(user_id, limit, cursor)
+    except InvalidCursorError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
-@app.get("/history/{user_id}")
-def get_user_history(user_id: str):
-    db = SessionLocal()
-    logs = db.query(VINLog).filter(VINLog.user_id == user_id).order_by(VINLog.timestamp.desc()).limit(10).all()
-    db.close()
+    return {"user_id": user_id, "history": history, "next_cursor": next_cursor}
 
-    history = []
-    for log in logs:
-        history.append({
-            "vin": log.vin,
-            "timestamp": log.timestamp.isoformat(),
-            "report": json.loads(log.report)
-        })
+@api_router.post("/stripe-webhook")
+async def stripe_webhook(request: Request):
+    try:
+        event = parse_webhook_event(
+            await request.body(), request.headers.get("Stripe-Signature"), STRIPE_WEBHOOK_SECRET
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid payload or signature")
 
-    return {"user_id": user_id, "history": history}
+    # The event is stored before we answer and credited in the background;
+    # a storage error (500) or a full queue (503) makes Stripe retry later
+    if not await stripe_events.accept(event):
+        raise HTTPException(status_code=503, detail="Busy")
+    return {"status": "ok"}
 
-@app.post(f"/{TELEGRAM_BOT_TOKEN}")
+@bot_router.post(f"/{TELEGRAM_BOT_TOKEN}")
 async def telegram_webhook(request: Request):
-    json_data = await request.json()
-    bot_app = ApplicationBuilder().token(TELEGRAM_BOT_TOKEN).build()
-    await bot_app.updater.process_update(Update.de_json(json_data, bot_app.bot))
+    if TELEGRAM_WEBHOOK_SECRET and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != TELEGRAM_WEBHOOK_SECRET:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    # Non-2xx makes Telegram redeliver later, which is our backpressure
+    if not telegram_bot.enqueue(await request.json()):
+        raise HTTPException(status_code=503, detail="Bot is busy")
     return {"status": "ok"}
 
-# ========== HELPERS ========== #
-
-def format_report_message(vin, r):
-    if not r:
-        return f"⚠️ Չհաջողվեց ստանալ VIN {vin}-ի տվյալները։"
-
-    return (
-        f"📄 <b>Վճարված VIN ստուգման արդյունքներ ({vin})</b>\n\n"
-        f"🏷️ Արտադրող: {r.get('make')}\n"
-        f"🚘 Մոդել: {r.get('model')}\n"
-        f"📆 Տարին: {r.get('year')}\n"
-        f"🚗 Տեսակ: {r.get('vehicle_type')}\n"
-        f"🏭 Գործարան: {r.get('plant_country')}\n"
-        f"🚙 Մարմնի տիպը: {r.get('body_class')}"
-    )
+if RUN_API:
+    app.include_router(api_router)
+if RUN_BOT:
+    app.include_router(bot_router)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,119 @@
+"""In-process latency histograms, exposed in Prometheus text format on /metrics.
+
+Kept dependency-free: each process keeps its own histograms, which is what
+Prometheus expects when it scrapes every worker.
+"""
+import functools
+import inspect
+import time
+from contextlib import contextmanager
+
+# Seconds; spans sub-millisecond cache/index hits up to slow upstream calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+
+    def _child(self, labels):
+        key = tuple((name, str(labels[name])) for name in self.labelnames)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+        return series
+
+    def observe(self, value, **labels):
+        series = self._child(labels)
+        series["sum"] += value
+        series["count"] += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series["counts"][i] += 1
+                break
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def timed(self, **labels):
+        """Decorator form of ``time()``; works on plain and async functions."""
+        def decorator(func):
+            if inspect.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    with self.time(**labels):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.time(**labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series["counts"]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(key + (('le', str(bound)),))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(key + (('le', '+Inf'),))} {series['count']}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {series['sum']}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {series['count']}")
+        return lines
+
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "carfact_http_request_seconds", "HTTP request latency by route", ("method", "route", "status"),
+)
+UPSTREAM_DECODE_SECONDS = Histogram(
+    "carfact_upstream_decode_seconds", "NHTSA vPIC call latency, including retries", ("endpoint",),
+)
+DB_SECONDS = Histogram(
+    "carfact_db_seconds", "Database call latency by operation", ("op",),
+)
+REPORT_FORMAT_SECONDS = Histogram(
+    "carfact_report_format_seconds", "Time to render a report for a reply", ("kind",),
+)
+BOT_REPLY_SECONDS = Histogram(
+    "carfact_bot_reply_seconds", "Bot handler time from update to reply sent", ("handler",),
+)
+
+HISTOGRAMS = (HTTP_REQUEST_SECONDS, UPSTREAM_DECODE_SECONDS, DB_SECONDS, REPORT_FORMAT_SECONDS, BOT_REPLY_SECONDS)
+
+
+def _flatten(prefix, stats):
+    for key, value in stats.items():
+        name = f"{prefix}_{key}"
+        if isinstance(value, dict):
+            yield from _flatten(name, value)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield name, value
+
+
+def render(stats=None):
+    """Histograms plus any numeric values in ``stats`` as gauges."""
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    for name, value in _flatten("carfact", stats or {}):
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,117 @@
+"""NHTSA vPIC client, the remote fallback behind the local VIN index.
+
+One keep-alive ``httpx.AsyncClient`` is shared by every request; a semaphore
+bounds how many decodes are in flight upstream at once, and transient
+failures are retried with exponential backoff and full jitter.
+"""
+import asyncio
+import os
+import random
+
+import httpx
+
+from metrics import UPSTREAM_DECODE_SECONDS
+
+NHTSA_BASE_URL = os.getenv("NHTSA_BASE_URL", "https://vpic.nhtsa.dot.gov/api/vehicles")
+NHTSA_CONCURRENCY = int(os.getenv("NHTSA_CONCURRENCY", "20"))
+NHTSA_RETRIES = int(os.getenv("NHTSA_RETRIES", "3"))
+# DecodeVINValuesBatch accepts at most 50 VINs per call
+NHTSA_BATCH_SIZE = 50
+
+# Per-stage timeouts, in seconds
+NHTSA_QUEUE_TIMEOUT = float(os.getenv("NHTSA_QUEUE_TIMEOUT", "5"))
+NHTSA_CONNECT_TIMEOUT = float(os.getenv("NHTSA_CONNECT_TIMEOUT", "3"))
+NHTSA_READ_TIMEOUT = float(os.getenv("NHTSA_READ_TIMEOUT", "10"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class NHTSAError(Exception):
+    pass
+
+
+class NHTSAClient:
+    def __init__(self, base_url=NHTSA_BASE_URL, concurrency=NHTSA_CONCURRENCY, retries=NHTSA_RETRIES,
+                 backoff=0.2):
+        self.base_url = base_url.rstrip("/")
+        self.retries = retries
+        self.backoff = backoff
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._concurrency = concurrency
+        self._client = None
+
+    async def start(self):
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=httpx.Timeout(NHTSA_READ_TIMEOUT, connect=NHTSA_CONNECT_TIMEOUT, pool=NHTSA_QUEUE_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=self._concurrency,
+                max_keepalive_connections=self._concurrency,
+            ),
+        )
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _request(self, method, path, **kwargs):
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), NHTSA_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise NHTSAError("Upstream concurrency limit reached") from None
+
+        try:
+            for attempt in range(self.retries + 1):
+                try:
+                    res = await self._client.request(method, path, **kwargs)
+                    if res.status_code not in RETRY_STATUSES:
+                        res.raise_for_status()
+                        return res.json()
+                    error = NHTSAError(f"NHTSA responded {res.status_code}")
+                except httpx.TransportError as e:
+                    error = NHTSAError(f"NHTSA request failed: {e!r}")
+                except httpx.HTTPStatusError as e:
+                    raise NHTSAError(f"NHTSA responded {e.response.status_code}") from e
+
+                if attempt < self.retries:
+                    await asyncio.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+            raise error
+        finally:
+            self._semaphore.release()
+
+    async def fetch_report(self, vin):
+        with UPSTREAM_DECODE_SECONDS.time(endpoint="decodevin"):
+            decoded = await self._request("GET", f"/decodevin/{vin}", params={"format": "json"})
+
+        fields = {item["Variable"]: item["Value"] for item in decoded["Results"] if item["Value"]}
+        return {
+            "vin": vin,
+            "make": fields.get("Make"),
+            "model": fields.get("Model"),
+            "year": fields.get("Model Year"),
+            "vehicle_type": fields.get("Vehicle Type"),
+            "plant_country": fields.get("Plant Country"),
+            "body_class": fields.get("Body Class"),
+        }
+
+    async def fetch_reports(self, vins):
+        """Decode up to NHTSA_BATCH_SIZE VINs in one call; returns {vin: report}."""
+        with UPSTREAM_DECODE_SECONDS.time(endpoint="batch"):
+            decoded = await self._request(
+                "POST", "/DecodeVINValuesBatch/", data={"format": "json", "data": ";".join(vins)}
+            )
+
+        reports = {}
+        for item in decoded["Results"]:
+            vin = (item.get("VIN") or "").upper()
+            reports[vin] = {
+                "vin": vin,
+                "make": item.get("Make") or None,
+                "model": item.get("Model") or None,
+                "year": item.get("ModelYear") or None,
+                "vehicle_type": item.get("VehicleType") or None,
+                "plant_country": item.get("PlantCountry") or None,
+                "body_class": item.get("BodyClass") or None,
+            }
+        return reports
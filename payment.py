@@ -1,26 +1,177 @@
 import stripe
 from dotenv import load_dotenv
+from urllib.parse import urlencode
+import asyncio
+import json
+import logging
+import threading
 import os
 
+import billing
+import database
+
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 stripe.api_key = os.getenv("STRIPE_SECRET_KEY")  # ✅ исправлено
+# Для локального стаба Stripe (benchmarks/stripe_stub.py)
+if os.getenv("STRIPE_API_BASE"):
+    stripe.api_base = os.getenv("STRIPE_API_BASE")
+
+STRIPE_EVENT_QUEUE_SIZE = int(os.getenv("STRIPE_EVENT_QUEUE_SIZE", "1000"))
+STRIPE_EVENT_RETRIES = 3
 
 # Замени на свои реальные price_id из Stripe Dashboard
 PRICE_ID_SINGLE = "price_1RKiWLDI5pzORPnjxmsygBsZ"
 PRICE_ID_BUNDLE3 = "price_1RKiWLDI5pzORPnjxmsygBsZ"
 
-def create_vin_payment(quantity: int, telegram_user_id: str):
+# Одна ссылка на пакет; пользователь передаётся через client_reference_id.
+# Ссылки хранятся в БД, чтобы не листать все PaymentLink аккаунта в Stripe
+_payment_links = {}
+_payment_links_locks = {1: threading.Lock(), 3: threading.Lock()}
+
+def _bundle_price(quantity: int) -> str:
     if quantity == 1:
-        price_id = PRICE_ID_SINGLE
+        return PRICE_ID_SINGLE
     elif quantity == 3:
-        price_id = PRICE_ID_BUNDLE3
+        return PRICE_ID_BUNDLE3
     else:
         raise ValueError("Only quantities 1 or 3 are supported.")
 
-    payment_link = stripe.PaymentLink.create(
-        line_items=[{"price": price_id, "quantity": 1}],
-        metadata={"quantity": quantity, "telegram_user_id": telegram_user_id},
-        after_completion={"type": "redirect", "redirect": {"url": "https://t.me/carfactarm_bot"}},
-    )
-    return payment_link.url
+def get_payment_link(quantity: int) -> str:
+    price_id = _bundle_price(quantity)
+    url = _payment_links.get(quantity)
+    if url:
+        return url
+
+    with _payment_links_locks[quantity]:
+        if quantity not in _payment_links:
+            # Переиспользуем ссылку, сохранённую до перезапуска, иначе создаём новую
+            url = database.get_payment_link_url(quantity, price_id)
+            if url is None:
+                url = stripe.PaymentLink.create(
+                    line_items=[{"price": price_id, "quantity": 1}],
+                    metadata={"quantity": quantity, "price_id": price_id},
+                    after_completion={"type": "redirect", "redirect": {"url": "https://t.me/carfactarm_bot"}},
+                ).url
+                url = database.save_payment_link_url(quantity, price_id, url)
+            _payment_links[quantity] = url
+        return _payment_links[quantity]
+
+def create_vin_payment(quantity: int, telegram_user_id: str):
+    return f"{get_payment_link(quantity)}?{urlencode({'client_reference_id': telegram_user_id})}"
+
+# Обработка вебхуков Stripe: эндпоинт только сохраняет событие и ставит его в очередь
+
+def parse_webhook_event(payload: bytes, signature: str, secret: str):
+    """Verify the Stripe-Signature header and return the event as a plain dict.
+
+    Raises ValueError on a bad payload or signature. Stripe objects stopped
+    being dicts in stripe 15, so handlers get ``to_dict()`` output instead.
+    """
+    try:
+        event = stripe.Webhook.construct_event(payload, signature, secret)
+    except stripe.error.SignatureVerificationError as e:
+        raise ValueError("Invalid Stripe signature") from e
+    return event.to_dict()
+
+async def handle_checkout_completed(session):
+    if session.get("payment_status") != "paid":
+        return
+
+    metadata = session.get("metadata") or {}
+    # Per-user links issued before client_reference_id carry the user in metadata
+    user_id = session.get("client_reference_id") or metadata.get("telegram_user_id")
+    quantity = int(metadata.get("quantity") or 0)
+    if not user_id or quantity <= 0:
+        logger.error("Checkout session has no user or quantity", extra={"session_id": session["id"]})
+        return
+
+    # Повторная доставка того же события ничего не начислит — reference уникален
+    balance = await billing.add_credits(user_id, quantity, reason="purchase", reference=session["id"])
+    if balance is not None:
+        logger.info(
+            "Credited VIN checks",
+            extra={"user_id": user_id, "quantity": quantity, "balance": balance, "session_id": session["id"]},
+        )
+
+EVENT_HANDLERS = {
+    "checkout.session.completed": handle_checkout_completed,
+}
+
+class StripeEventQueue:
+    """Events are stored in ``stripe_events`` before the webhook is acknowledged
+    and marked done or failed once handled, so nothing is lost on restart.
+    Failed rows keep their payload; set them back to pending to replay them."""
+
+    def __init__(self, maxsize=STRIPE_EVENT_QUEUE_SIZE):
+        self._queue = asyncio.Queue(maxsize=maxsize)
+        self._task = None
+
+    async def start(self):
+        if self._task is None:
+            # Events accepted before the last shutdown but not yet handled
+            for event in await asyncio.to_thread(database.get_pending_stripe_events, self._queue.maxsize):
+                self._queue.put_nowait(event)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def accept(self, event) -> bool:
+        """Persist and queue ``event``. Raises if it can't be stored; False means
+        the queue is full. Either way the webhook should fail so Stripe retries."""
+        if event["type"] not in EVENT_HANDLERS:
+            return True
+        status = await asyncio.to_thread(database.save_stripe_event, event["id"], event["type"], event)
+        if status != "pending":
+            return True  # Redelivery of an event that was already handled
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    async def _run(self):
+        while True:
+            event = await self._queue.get()
+            try:
+                await self._process(event)
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, event):
+        handler = EVENT_HANDLERS[event["type"]]
+        for attempt in range(1, STRIPE_EVENT_RETRIES + 1):
+            try:
+                await handler(event["data"]["object"])
+            except Exception as e:
+                logger.exception("Stripe event failed", extra={"event_id": event["id"], "attempt": attempt})
+                error = e
+                if attempt < STRIPE_EVENT_RETRIES:
+                    await asyncio.sleep(2 ** (attempt - 1))
+                continue
+            await self._finish(event, "done", attempt)
+            return
+
+        logger.error(
+            "Stripe event dropped after retries",
+            extra={"event_id": event["id"], "payload": json.dumps(event)},
+        )
+        await self._finish(event, "failed", STRIPE_EVENT_RETRIES, repr(error))
+
+    async def _finish(self, event, status, attempts, error=None):
+        # If this fails the row stays pending and is handled again on restart;
+        # handlers are idempotent
+        try:
+            await asyncio.to_thread(database.finish_stripe_event, event["id"], status, attempts, error)
+        except Exception:
+            logger.exception("Recording Stripe event status failed", extra={"event_id": event["id"]})
+
+stripe_events = StripeEventQueue()
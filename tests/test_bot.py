@@ -0,0 +1,37 @@
+import asyncio
+
+from bot import TelegramBot
+
+class FakeApplication:
+    def __init__(self):
+        self.processed = []
+        self.stopped = False
+
+    async def process_update(self, update):
+        await asyncio.sleep(0.01)
+        self.processed.append(update)
+
+    async def stop(self):
+        self.stopped = True
+
+    async def shutdown(self):
+        pass
+
+def test_stop_drains_queued_updates_and_rejects_new_ones():
+    async def scenario():
+        bot = TelegramBot(mode="webhook", workers=2)
+        application = bot.application = FakeApplication()
+        bot._tasks = [asyncio.create_task(bot._worker(application)) for _ in range(bot.workers)]
+        for update_id in range(10):
+            bot._queue.put_nowait(update_id)
+
+        stopping = asyncio.create_task(bot.stop())
+        await asyncio.sleep(0)
+        assert bot.enqueue({"update_id": 99}) is False
+        await stopping
+
+        assert sorted(application.processed) == list(range(10))
+        assert application.stopped
+        assert bot.application is None
+
+    asyncio.run(scenario())
@@ -0,0 +1,36 @@
+import asyncio
+import logging
+
+from log_writer import LogWriter
+
+def test_full_queue_waits_for_room_by_default():
+    async def scenario():
+        flushed = []
+        writer = LogWriter(flushed.extend, max_queue=1, interval=0.01)
+        await writer.write(("A", 1, {}))
+        # Queue is full and nothing drains it yet
+        blocked = asyncio.create_task(writer.write(("B", 1, {})))
+        await asyncio.sleep(0.05)
+        assert not blocked.done()
+
+        await writer.start()
+        await blocked
+        await writer.stop()
+        assert [row[0] for row in flushed] == ["A", "B"]
+        assert writer.stats()["dropped_audit_rows"] == 0
+
+    asyncio.run(scenario())
+
+def test_put_timeout_logs_lost_audit_row(caplog):
+    async def scenario():
+        writer = LogWriter(lambda rows: None, max_queue=1, put_timeout=0.01)
+        await writer.write(("A", 1, {}))
+        await writer.write(("B", 2, {}))
+        return writer
+
+    with caplog.at_level(logging.ERROR, logger="log_writer"):
+        writer = asyncio.run(scenario())
+
+    assert writer.stats()["dropped_audit_rows"] == 1
+    record, = caplog.records
+    assert (record.vin, record.user_id) == ("B", 2)
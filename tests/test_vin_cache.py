@@ -0,0 +1,42 @@
+import asyncio
+
+from vin_cache import ReportCache
+
+
+def report(vin):
+    return {"vin": vin, "make": "HONDA"}
+
+
+async def fetch_one(vin):
+    return report(vin)
+
+
+async def fetch_many(vins):
+    for vin in vins:
+        yield vin, report(vin)
+
+
+def test_closing_iter_many_early_releases_claimed_vins():
+    async def scenario():
+        cache = ReportCache()
+        await cache.get_or_fetch("A", fetch_one)
+
+        # B and C are claimed up front; stop after the first (cached) result
+        results = cache.iter_many(["B", "A", "C"], fetch_many)
+        first = await results.__anext__()
+        await results.aclose()
+
+        assert first == ("A", report("A"))
+        assert not cache._inflight
+        return await asyncio.wait_for(cache.get_or_fetch("B", fetch_one), 1)
+
+    assert asyncio.run(scenario()) == report("B")
+
+
+def test_iter_many_yields_hits_then_fetched():
+    async def scenario():
+        cache = ReportCache()
+        await cache.get_or_fetch("A", fetch_one)
+        return [vin async for vin, _ in cache.iter_many(["B", "A"], fetch_many)]
+
+    assert asyncio.run(scenario()) == ["A", "B"]
@@ -0,0 +1,153 @@
+"""Two-tier cache for decoded VIN reports.
+
+Tier one is an in-process LRU bounded by entry count; tier two is a durable
+store (the ``vin_reports`` table) reached through the async ``load``/``store``
+callables. Concurrent misses for the same VIN share a single in-flight fetch,
+and writes to the durable tier happen in the background.
+"""
+import asyncio
+from collections import OrderedDict
+
+
+class ReportCache:
+    def __init__(self, maxsize=10_000, load=None, store=None):
+        """``load(vins)`` returns ``{vin: report}`` for the VINs it has;
+        ``store(vin, report)`` persists one report."""
+        self.maxsize = maxsize
+        self._load = load
+        self._store = store
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._background = set()
+        self._counters = dict.fromkeys(("hits", "db_hits", "misses", "coalesced", "evictions"), 0)
+
+    def _lookup(self, vin):
+        report = self._entries.get(vin)
+        if report is not None:
+            self._entries.move_to_end(vin)
+            self._counters["hits"] += 1
+        return report
+
+    def _claim(self, vin):
+        self._inflight[vin] = asyncio.get_running_loop().create_future()
+
+    def _resolve(self, vin, report, store=False):
+        self._put(vin, report)
+        if store and self._store:
+            self._spawn(self._store(vin, report))
+        future = self._inflight.pop(vin, None)
+        if future is not None and not future.done():
+            future.set_result(report)
+
+    def _fail(self, vin, error=None):
+        future = self._inflight.pop(vin, None)
+        if future is None or future.done():
+            return
+        future.set_exception(error or LookupError(f"Lookup for {vin} was abandoned"))
+        # Nobody may be waiting on the shared future; don't warn about it
+        future.exception()
+
+    async def get_or_fetch(self, vin, fetch):
+        """Return the report for ``vin``, awaiting ``fetch(vin)`` only on a full miss."""
+        report = self._lookup(vin)
+        if report is not None:
+            return dict(report)
+
+        future = self._inflight.get(vin)
+        if future is not None:
+            self._counters["coalesced"] += 1
+            return dict(await asyncio.shield(future))
+
+        self._claim(vin)
+        try:
+            loaded = await self._load([vin]) if self._load else {}
+            if vin in loaded:
+                self._counters["db_hits"] += 1
+                report = loaded[vin]
+                self._resolve(vin, report)
+            else:
+                self._counters["misses"] += 1
+                report = await fetch(vin)
+                self._resolve(vin, report, store=True)
+        except asyncio.CancelledError:
+            self._fail(vin)
+            raise
+        except Exception as e:
+            self._fail(vin, e)
+            raise
+
+        return dict(report)
+
+    async def iter_many(self, vins, fetch_many):
+        """Yield ``(vin, report_or_exception)`` for each of ``vins`` as it resolves.
+
+        Cached and durable entries come first, each loaded in one go; the rest
+        are passed together to ``fetch_many(vins)``, an async iterator of the
+        same pairs. VINs already being fetched elsewhere are awaited, not refetched.
+        """
+        hits, pending, waiting = [], [], []
+        for vin in vins:
+            report = self._lookup(vin)
+            if report is not None:
+                hits.append((vin, dict(report)))
+            elif vin in self._inflight:
+                self._counters["coalesced"] += 1
+                waiting.append((vin, self._inflight[vin]))
+            else:
+                self._claim(vin)
+                pending.append(vin)
+
+        # Nothing is yielded before this try: a consumer that stops at any
+        # point must still release the VINs claimed above
+        try:
+            for vin, report in hits:
+                yield vin, report
+
+            if pending and self._load:
+                loaded = await self._load(pending)
+                for vin, report in loaded.items():
+                    self._counters["db_hits"] += 1
+                    self._resolve(vin, report)
+                    yield vin, dict(report)
+                pending = [vin for vin in pending if vin not in loaded]
+
+            if pending:
+                self._counters["misses"] += len(pending)
+                async for vin, report in fetch_many(pending):
+                    if isinstance(report, Exception):
+                        self._fail(vin, report)
+                        yield vin, report
+                    else:
+                        self._resolve(vin, report, store=True)
+                        yield vin, dict(report)
+        finally:
+            # Anything claimed but never resolved (error or early exit) is released
+            for vin in pending:
+                if vin in self._inflight:
+                    self._fail(vin)
+
+        for vin, future in waiting:
+            try:
+                yield vin, dict(await asyncio.shield(future))
+            except Exception as e:
+                yield vin, e
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def _put(self, vin, report):
+        self._entries[vin] = report
+        self._entries.move_to_end(vin)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    async def drain(self):
+        """Wait for pending durable writes, e.g. on shutdown."""
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+
+    def stats(self):
+        return {**self._counters, "size": len(self._entries), "maxsize": self.maxsize}
@@ -0,0 +1,273 @@
+"""Offline VIN decoding from a precomputed vPIC index.
+
+The index is a single binary file built from a vPIC snapshot (see
+``build_index``) and memory-mapped at startup. Lookups are binary searches
+over fixed-width sorted records, so decoding never leaves the process.
+
+    python vin_decoder.py build snapshot.jsonl data/vin_index.bin
+"""
+import csv
+import json
+import mmap
+import struct
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+VIN_LENGTH = 17
+VIN_ALPHABET = frozenset("ABCDEFGHJKLMNPRSTUVWXYZ0123456789")
+
+REPORT_FIELDS = ("make", "model", "year", "vehicle_type", "plant_country", "body_class")
+
+# 49 CFR 565.15 transliteration and position weights for the check digit
+_TRANSLITERATION = {
+    **{str(d): d for d in range(10)},
+    "A": 1, "B": 2, "C": 3, "D": 4, "E": 5, "F": 6, "G": 7, "H": 8,
+    "J": 1, "K": 2, "L": 3, "M": 4, "N": 5, "P": 7, "R": 9,
+    "S": 2, "T": 3, "U": 4, "V": 5, "W": 6, "X": 7, "Y": 8, "Z": 9,
+}
+_WEIGHTS = (8, 7, 6, 5, 4, 3, 2, 10, 0, 9, 8, 7, 6, 5, 4, 3, 2)
+
+# Position 10 codes, in order, starting at 1980 (and again at 2010)
+_YEAR_CODES = "ABCDEFGHJKLMNPRSTVWXY123456789"
+
+# vPIC vehicle types the position-7 year rule applies to. "TRUCK" is left out:
+# it also covers heavy trucks, and the index has no GVWR to tell them apart.
+_LIGHT_VEHICLE_TYPES = frozenset({"PASSENGER CAR", "MULTIPURPOSE PASSENGER VEHICLE (MPV)"})
+
+# Index layout: header, three sorted record sections, string offsets, string blob
+_MAGIC = b"VPIC"
+_VERSION = 1
+_HEADER = struct.Struct("<4sHHIIII")
+_WMI_RECORD = struct.Struct("<3sII")    # WMI -> make, vehicle type
+_PLANT_RECORD = struct.Struct("<4sI")   # WMI + plant code -> plant country
+_VDS_RECORD = struct.Struct("<8sII")    # WMI + VDS -> model, body class
+_OFFSET = struct.Struct("<I")
+
+
+def is_north_american(vin: str) -> bool:
+    return vin[:1] in "12345"
+
+
+def check_digit(vin: str) -> str:
+    total = sum(_TRANSLITERATION[c] * w for c, w in zip(vin, _WEIGHTS))
+    remainder = total % 11
+    return "X" if remainder == 10 else str(remainder)
+
+
+def is_valid_vin(vin: str) -> bool:
+    """Structural validation: length, alphabet (no I/O/Q) and check digit.
+
+    The check digit is only mandatory for North American VINs, so it is not
+    enforced for other regions.
+    """
+    if len(vin) != VIN_LENGTH or not VIN_ALPHABET.issuperset(vin):
+        return False
+    if is_north_american(vin):
+        return vin[8] == check_digit(vin)
+    return True
+
+
+def model_year(vin: str, vehicle_type=None):
+    """Resolve the model year from position 10.
+
+    The 30-year cycle is disambiguated by position 7 (numeric before 2010,
+    alphabetic from 2010), which only holds for North American passenger
+    cars and MPVs; for any other (or unknown) ``vehicle_type`` the year is
+    left unresolved.
+    """
+    if not is_north_american(vin) or vehicle_type not in _LIGHT_VEHICLE_TYPES:
+        return None
+    index = _YEAR_CODES.find(vin[9])
+    if index < 0:
+        return None
+    return (2010 if vin[6].isalpha() else 1980) + index
+
+
+class VINDecoder:
+    """Read-only view over a memory-mapped index file."""
+
+    def __init__(self, buffer=None):
+        self._buf = buffer
+        self._sections = None
+        if buffer is not None:
+            self._parse_header()
+
+    @classmethod
+    def open(cls, path):
+        """Map the index at ``path``; a missing file yields an empty decoder."""
+        path = Path(path)
+        if not path.is_file() or path.stat().st_size == 0:
+            return cls()
+        with open(path, "rb") as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    @property
+    def loaded(self) -> bool:
+        return self._buf is not None
+
+    def _parse_header(self):
+        magic, version, _, n_wmi, n_plant, n_vds, n_strings = _HEADER.unpack_from(self._buf, 0)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError("Unsupported VIN index format")
+
+        offset = _HEADER.size
+        sections = {}
+        for name, record, count in (
+            ("wmi", _WMI_RECORD, n_wmi),
+            ("plant", _PLANT_RECORD, n_plant),
+            ("vds", _VDS_RECORD, n_vds),
+        ):
+            sections[name] = (offset, record, count)
+            offset += record.size * count
+
+        self._sections = sections
+        self._strings_offsets = offset
+        self._strings_base = offset + _OFFSET.size * (n_strings + 1)
+
+    def _search(self, section: str, key: bytes):
+        start, record, count = self._sections[section]
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            entry = record.unpack_from(self._buf, start + mid * record.size)
+            if entry[0] < key:
+                lo = mid + 1
+            elif entry[0] > key:
+                hi = mid
+            else:
+                return entry[1:]
+        return None
+
+    def _string(self, string_id: int):
+        if not string_id:
+            return None
+        base = self._strings_offsets + string_id * _OFFSET.size
+        begin = _OFFSET.unpack_from(self._buf, base)[0]
+        end = _OFFSET.unpack_from(self._buf, base + _OFFSET.size)[0]
+        return bytes(self._buf[self._strings_base + begin:self._strings_base + end]).decode("utf-8")
+
+    def decode(self, vin: str) -> dict:
+        """Return a report with every field the index can resolve; others are None."""
+        report = {"vin": vin, **dict.fromkeys(REPORT_FIELDS)}
+        if not self.loaded:
+            return report
+
+        wmi = vin[:3].encode("ascii")
+        hit = self._search("wmi", wmi)
+        if hit:
+            report["make"], report["vehicle_type"] = map(self._string, hit)
+            # Only trusted once the index confirms a light vehicle
+            year = model_year(vin, report["vehicle_type"])
+            report["year"] = str(year) if year else None
+
+        hit = self._search("plant", wmi + vin[10].encode("ascii"))
+        if hit:
+            report["plant_country"] = self._string(hit[0])
+
+        hit = self._search("vds", wmi + vin[3:8].encode("ascii"))
+        if hit:
+            report["model"], report["body_class"] = map(self._string, hit)
+
+        return report
+
+    def close(self):
+        if self._buf is not None:
+            self._buf.close()
+            self._buf = None
+
+
+# ========== INDEX BUILDER ========== #
+
+# vPIC flat-format column names (DecodeVinValues / DecodeVINValuesBatch)
+_SNAPSHOT_COLUMNS = {
+    "make": "Make",
+    "model": "Model",
+    "vehicle_type": "VehicleType",
+    "plant_country": "PlantCountry",
+    "body_class": "BodyClass",
+}
+
+
+def read_snapshot(path):
+    """Yield flat vPIC result rows from a ``.csv`` or JSON-lines snapshot."""
+    path = Path(path)
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.suffix.lower() == ".csv":
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def _unanimous(values):
+    """Keep a mapping only when every snapshot row agrees on it."""
+    return {key: next(iter(seen)) for key, seen in values.items() if len(seen) == 1}
+
+
+def build_index(rows, path):
+    """Aggregate decoded vPIC rows into an index file at ``path``.
+
+    Returns the number of (wmi, plant, vds) records written.
+    """
+    wmi_values = defaultdict(set)
+    plant_values = defaultdict(set)
+    vds_values = defaultdict(set)
+
+    for row in rows:
+        vin = (row.get("VIN") or "").strip().upper()
+        if len(vin) != VIN_LENGTH or not VIN_ALPHABET.issuperset(vin):
+            continue
+        values = {field: (row.get(column) or "").strip() for field, column in _SNAPSHOT_COLUMNS.items()}
+
+        if values["make"]:
+            wmi_values[vin[:3]].add((values["make"], values["vehicle_type"]))
+        if values["plant_country"]:
+            plant_values[vin[:3] + vin[10]].add((values["plant_country"],))
+        if values["model"] or values["body_class"]:
+            vds_values[vin[:3] + vin[3:8]].add((values["model"], values["body_class"]))
+
+    strings = [""]
+    string_ids = {"": 0}
+
+    def intern(value):
+        if value not in string_ids:
+            string_ids[value] = len(strings)
+            strings.append(value)
+        return string_ids[value]
+
+    sections = []
+    for record, values in (
+        (_WMI_RECORD, _unanimous(wmi_values)),
+        (_PLANT_RECORD, _unanimous(plant_values)),
+        (_VDS_RECORD, _unanimous(vds_values)),
+    ):
+        sections.append([
+            record.pack(key.encode("ascii"), *map(intern, value))
+            for key, value in sorted(values.items())
+        ])
+
+    blob = bytearray()
+    offsets = [0]
+    for value in strings:
+        blob += value.encode("utf-8")
+        offsets.append(len(blob))
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, _VERSION, 0, *(len(s) for s in sections), len(strings)))
+        for section in sections:
+            f.writelines(section)
+        f.writelines(_OFFSET.pack(o) for o in offsets)
+        f.write(blob)
+
+    return tuple(len(s) for s in sections)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] != "build":
+        sys.exit("usage: python vin_decoder.py build <snapshot.jsonl|csv> <index.bin>")
+    counts = build_index(read_snapshot(sys.argv[2]), sys.argv[3])
+    print(f"✅ Index written: {counts[0]} WMI, {counts[1]} plant, {counts[2]} VDS records")
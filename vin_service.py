@@ -0,0 +1,315 @@
+"""VIN lookup, persistence and history, shared by the HTTP routes and the bot.
+
+Everything here is async: blocking database calls run in worker threads, and
+writes that the caller doesn't need to wait for are scheduled in the
+background and drained by ``shutdown()``.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import billing
+import database
+import nhtsa
+from billing import InsufficientCreditsError
+from log_writer import LogWriter
+from metrics import DB_SECONDS
+from vin_cache import ReportCache
+from vin_decoder import VINDecoder, REPORT_FIELDS, is_valid_vin
+
+BASE_DIR = Path(__file__).resolve().parent
+VIN_INDEX_PATH = os.getenv("VIN_INDEX_PATH", str(BASE_DIR / "data" / "vin_index.bin"))
+VIN_CACHE_SIZE = int(os.getenv("VIN_CACHE_SIZE", "10000"))
+DB_TIMEOUT = float(os.getenv("DB_TIMEOUT", "3"))
+BATCH_MAX_VINS = int(os.getenv("BATCH_MAX_VINS", "500"))
+HISTORY_MAX_LIMIT = 100
+# Each successful VIN lookup costs one credit
+CHARGE_VIN_CHECKS = os.getenv("CHARGE_VIN_CHECKS", "true").lower() in ("1", "true", "yes")
+
+_EPOCH = datetime(1970, 1, 1)
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidVINError(ValueError):
+    pass
+
+
+class VINLookupError(Exception):
+    pass
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+def _has_data(report) -> bool:
+    return any(report.get(field) is not None for field in REPORT_FIELDS)
+
+
+async def _load_reports(vins):
+    # A slow database shouldn't hold the lookup up; treat it as a miss
+    try:
+        with DB_SECONDS.time(op="load_reports"):
+            loaded = await asyncio.wait_for(asyncio.to_thread(database.load_reports, vins), DB_TIMEOUT)
+    except Exception:
+        logger.exception("Loading cached reports failed", extra={"vins": len(vins)})
+        return {}
+    # Empty reports stored before they were rejected are refetched, not served
+    return {vin: report for vin, report in loaded.items() if _has_data(report)}
+
+
+async def _store_report(vin, report):
+    try:
+        with DB_SECONDS.time(op="store_report"):
+            await asyncio.to_thread(database.store_report, vin, report)
+    except Exception:
+        logger.exception("Storing report failed", extra={"vin": vin})
+
+
+# Built by ``startup()``, so importing this module stays cheap:
+# the offline decoder answers from the vPIC index before falling back to NHTSA
+vin_decoder = None
+nhtsa_client = None
+report_cache = None
+# VINLog rows are buffered and written in batches, off the request path
+log_writer = None
+
+
+# Refunds run as their own tasks so a cancelled caller can't abort them
+_refunds = set()
+
+
+async def _refund(user_id, amount=1):
+    if not CHARGE_VIN_CHECKS or amount <= 0:
+        return
+    task = asyncio.create_task(billing.refund(user_id, amount))
+    _refunds.add(task)
+    task.add_done_callback(_refunds.discard)
+    await asyncio.shield(task)
+
+
+async def startup():
+    global vin_decoder, nhtsa_client, report_cache, log_writer
+    # Schema creation, the DB engine, the index mmap and the clients are set up here, not at import time
+    await asyncio.to_thread(database.init_db)
+    vin_decoder = VINDecoder.open(VIN_INDEX_PATH)
+    nhtsa_client = nhtsa.NHTSAClient()
+    report_cache = ReportCache(VIN_CACHE_SIZE, load=_load_reports, store=_store_report)
+    log_writer = LogWriter(database.save_vin_logs)
+    await nhtsa_client.start()
+    await log_writer.start()
+
+
+async def shutdown():
+    await asyncio.gather(*_refunds, return_exceptions=True)
+    await report_cache.drain()
+    await log_writer.stop()
+    await nhtsa_client.aclose()
+
+
+def normalize_vin(vin: str) -> str:
+    vin = vin.strip().upper()
+    if not is_valid_vin(vin):
+        raise InvalidVINError(vin)
+    return vin
+
+
+async def decode_report(vin):
+    report = vin_decoder.decode(vin)
+
+    # Only go to NHTSA for the fields the local index couldn't resolve
+    missing = [field for field in REPORT_FIELDS if report[field] is None]
+    if missing:
+        remote = await nhtsa_client.fetch_report(vin)
+        for field in missing:
+            report[field] = remote[field]
+
+    # Nothing resolved (e.g. an NHTSA error result): fail rather than cache and charge for it
+    if not _has_data(report):
+        raise VINLookupError(vin)
+    return report
+
+
+async def decode_reports(vins):
+    """Async-iterate ``(vin, report_or_exception)``, batching NHTSA calls.
+
+    VINs the local index resolves completely are yielded immediately; the
+    rest go to DecodeVINValuesBatch in concurrent chunks, yielded as each
+    chunk completes.
+    """
+    partial = {}
+    for vin in vins:
+        report = vin_decoder.decode(vin)
+        if all(report[field] is not None for field in REPORT_FIELDS):
+            yield vin, report
+        else:
+            partial[vin] = report
+    if not partial:
+        return
+
+    async def fetch_chunk(chunk):
+        try:
+            return chunk, await nhtsa_client.fetch_reports(chunk)
+        except Exception as e:
+            return chunk, e
+
+    remote_vins = list(partial)
+    tasks = [
+        asyncio.create_task(fetch_chunk(remote_vins[i:i + nhtsa.NHTSA_BATCH_SIZE]))
+        for i in range(0, len(remote_vins), nhtsa.NHTSA_BATCH_SIZE)
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            chunk, remote = await next_done
+            for vin in chunk:
+                # A VIN missing from the reply is an error, not an empty report
+                if isinstance(remote, Exception) or vin not in remote:
+                    yield vin, VINLookupError(vin)
+                    continue
+                report = partial[vin]
+                for field in REPORT_FIELDS:
+                    if report[field] is None:
+                        report[field] = remote[vin][field]
+                yield vin, report if _has_data(report) else VINLookupError(vin)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def check_vin(vin: str, user_id: str) -> dict:
+    """Decode ``vin`` for ``user_id``, charging one credit, and log the lookup.
+
+    Raises InvalidVINError for malformed VINs, InsufficientCreditsError when
+    the user can't pay, and VINLookupError (after refunding) when the report
+    can't be produced.
+    """
+    vin = normalize_vin(vin)
+    if CHARGE_VIN_CHECKS:
+        await billing.charge(user_id)
+
+    try:
+        report = await report_cache.get_or_fetch(vin, decode_report)
+    except Exception as e:
+        await _refund(user_id)
+        raise VINLookupError(vin) from e
+
+    await log_writer.write((vin, user_id, report))
+    return report
+
+
+async def check_vins(vins: list, user_id: str):
+    """Validate ``vins``, charge for the valid ones and return a BatchResults
+    iterator of one result dict per distinct VIN, produced as soon as each is known.
+
+    Results have ``status`` "ok" (with ``report``), "invalid" or "error".
+    Successful lookups go to the buffered log writer, which inserts them in bulk.
+    Raises InsufficientCreditsError before any lookup if the user can't pay.
+    """
+    if len(vins) > BATCH_MAX_VINS:
+        raise ValueError(f"At most {BATCH_MAX_VINS} VINs per batch")
+
+    valid, invalid = [], []
+    for raw in dict.fromkeys(v.strip().upper() for v in vins):
+        try:
+            valid.append(normalize_vin(raw))
+        except InvalidVINError:
+            invalid.append(raw)
+
+    if CHARGE_VIN_CHECKS and valid:
+        await billing.charge(user_id, len(valid))
+
+    return BatchResults(valid, invalid, user_id)
+
+
+class BatchResults:
+    """Async iterator over a batch that has already been charged.
+
+    Credits for VINs that don't come back "ok" are refunded by ``aclose()``,
+    which runs automatically once iteration ends or raises. Unlike a bare
+    async generator's ``finally``, this holds even if iteration never
+    started, so callers that stop early only need to call ``aclose()``.
+    """
+
+    def __init__(self, valid, invalid, user_id):
+        self.user_id = user_id
+        self._charged = len(valid)
+        self._delivered = 0
+        self._closed = False
+        self._results = self._iterate(valid, invalid)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return await self._results.__anext__()
+        except BaseException:
+            await self.aclose()
+            raise
+
+    async def aclose(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            await self._results.aclose()
+        finally:
+            await _refund(self.user_id, self._charged - self._delivered)
+
+    def __del__(self):
+        # Last resort for a caller that dropped the iterator without closing it
+        if not self._closed and CHARGE_VIN_CHECKS and self._charged > self._delivered:
+            logger.error(
+                "Batch results were never closed; refunding",
+                extra={"user_id": self.user_id, "amount": self._charged - self._delivered},
+            )
+            try:
+                task = asyncio.get_running_loop().create_task(self.aclose())
+            except RuntimeError:
+                return
+            _refunds.add(task)
+            task.add_done_callback(_refunds.discard)
+
+    async def _iterate(self, valid, invalid):
+        for raw in invalid:
+            yield {"vin": raw, "status": "invalid"}
+
+        async for vin, report in report_cache.iter_many(valid, decode_reports):
+            if isinstance(report, Exception):
+                yield {"vin": vin, "status": "error"}
+            else:
+                await log_writer.write((vin, self.user_id, report))
+                self._delivered += 1
+                yield {"vin": vin, "status": "ok", "report": report}
+
+
+def encode_cursor(key) -> str:
+    timestamp, log_id = key
+    return f"{(timestamp - _EPOCH) // timedelta(microseconds=1)}-{log_id}"
+
+
+def decode_cursor(cursor: str):
+    try:
+        micros, log_id = cursor.split("-")
+        return _EPOCH + timedelta(microseconds=int(micros)), int(log_id)
+    except (ValueError, OverflowError):
+        raise InvalidCursorError(cursor) from None
+
+
+async def get_history(user_id: str, limit: int = 10, cursor: str = None):
+    """Return one page of ``user_id``'s lookups, newest first, and the cursor
+    for the next page (None on the last page)."""
+    limit = max(1, min(limit, HISTORY_MAX_LIMIT))
+    before = decode_cursor(cursor) if cursor else None
+    with DB_SECONDS.time(op="get_user_history"):
+        history, next_key = await asyncio.to_thread(database.get_user_history, user_id, limit, before)
+    return history, encode_cursor(next_key) if next_key else None
+
+
+def stats() -> dict:
+    if report_cache is None:
+        return {}
+    return {"cache": report_cache.stats(), "log_writer": log_writer.stats()}